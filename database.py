@@ -24,7 +24,8 @@ engine = create_engine(
     max_overflow=20,     # Max number of connections to create beyond pool_size
     pool_timeout=30,     # Seconds to wait before giving up on getting a connection
     pool_recycle=1800,   # Recycle connections after 30 minutes
-    echo=True           # Set to False in production
+    # Logging every statement costs a formatted write per query; opt in with SQL_ECHO=1
+    echo=os.getenv("SQL_ECHO", "").lower() in ("1", "true", "yes")
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
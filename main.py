@@ -1,10 +1,10 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
-import os
 
 load_dotenv()
 
@@ -14,8 +14,12 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 from database import engine, Base
 from routers import upload, generate, upload_and_generate
 
-# create DB tables (simple approach for prototype)
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # create DB tables (simple approach for prototype); done at startup rather
+    # than on import so tools importing the app don't need a live database
+    Base.metadata.create_all(bind=engine)
+    yield
 
 # Maximum file sizes in bytes
 MAX_IMAGE_SIZE = 3 * 1024 * 1024  # 3 MB
@@ -23,6 +27,7 @@ MAX_PDF_SIZE = 15 * 1024 * 1024  # 15 MB
 
 app = FastAPI(
     title="Question Generation Backend",
+    lifespan=lifespan,
     # Set default request body size limit (slightly larger than our max file size)
     max_upload_size=MAX_PDF_SIZE + (1 * 1024 * 1024)  # 16 MB to be safe
 )
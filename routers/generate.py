@@ -26,6 +26,11 @@ router = APIRouter(prefix="/api", tags=["questions"])
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "pdf"}
 
+# Maximum number of images processed at once across all requests; each one
+# runs a full Tesseract sweep and up to two Groq calls
+MAX_CONCURRENT_IMAGES = int(os.getenv("MAX_CONCURRENT_IMAGES", "4"))
+_image_slots = asyncio.Semaphore(MAX_CONCURRENT_IMAGES)
+
 def get_file_extension(file_path: str) -> str:
     """Get the file extension in lowercase"""
     return Path(file_path).suffix.lower().lstrip('.')
@@ -44,24 +49,30 @@ async def process_image(file_path: str) -> Dict[str, str]:
     try:
         # Check if the functions are async or not and call them appropriately
         if hasattr(ocr_service, 'extract_text') and asyncio.iscoroutinefunction(ocr_service.extract_text):
-            text = await ocr_service.extract_text(file_path)
+            text_coro = ocr_service.extract_text(file_path)
         elif hasattr(ocr_service, 'extract_text_from_path'):
-            text = await asyncio.to_thread(ocr_service.extract_text_from_path, file_path)
+            text_coro = asyncio.to_thread(ocr_service.extract_text_from_path, file_path)
         else:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="No valid OCR function found"
             )
         
-        # Get description using the synchronous version of describe_image_stub
-        description = ""
+        # Get description on the running loop; the sync wrapper would spin up
+        # a new event loop in a worker thread for every image
         if hasattr(vision_service, 'describe_image') and asyncio.iscoroutinefunction(vision_service.describe_image):
-            description = await vision_service.describe_image(file_path)
-        elif hasattr(vision_service, 'describe_image_stub_sync'):
-            description = await asyncio.to_thread(vision_service.describe_image_stub_sync, file_path)
+            description_coro = vision_service.describe_image(file_path)
         elif hasattr(vision_service, 'describe_image_stub'):
-            # Fallback to async version if sync version not available
-            description = await vision_service.describe_image_stub(file_path)
+            description_coro = vision_service.describe_image_stub(file_path)
+        elif hasattr(vision_service, 'describe_image_stub_sync'):
+            # Fallback to sync version if async version not available
+            description_coro = asyncio.to_thread(vision_service.describe_image_stub_sync, file_path)
+        else:
+            description_coro = asyncio.sleep(0, result="")
+        
+        # OCR and description are independent, so run them concurrently
+        async with _image_slots:
+            text, description = await asyncio.gather(text_coro, description_coro)
             
         return {"text": text, "description": description, "type": "image"}
     except Exception as e:
@@ -156,8 +167,17 @@ async def generate_from_files(
             subject=req.subject
         )
         
-        # Save questions to database
-        response_questions = []
+        # The service returns a JSON string; failures come back as [{"error": ...}]
+        questions = json.loads(questions)
+        errors = [q["error"] for q in questions if isinstance(q, dict) and "error" in q]
+        if errors:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Question generation failed: {errors[0]}"
+            )
+        
+        # Save questions to database in a single transaction
+        db_questions = []
         for q in questions:
             db_question = Question(
                 teacher_id=req.teacher_id,
@@ -172,9 +192,14 @@ async def generate_from_files(
                 metadata_=json.dumps(q)
             )
             db.add(db_question)
-            db.commit()
-            db.refresh(db_question)
-            
+            db_questions.append(db_question)
+        
+        # Flush once to get the generated IDs, and build the response before
+        # committing so the objects don't have to be reloaded afterwards
+        db.flush()
+        
+        response_questions = []
+        for db_question in db_questions:
             question_data = {
                 "id": db_question.id,
                 "question": db_question.question_text,
@@ -190,6 +215,8 @@ async def generate_from_files(
                 question_data["rationale"] = db_question.rationale
             response_questions.append(question_data)
         
+        db.commit()
+        
         return {"status": "success", "questions": response_questions}
     
     except HTTPException:
@@ -307,9 +334,6 @@ async def get_questions(
             else:
                 query = query.filter(Question.choices == None)  # noqa: E711
         
-        # Get total count before pagination
-        total = query.count()
-        
         # Apply ordering
         order_column = getattr(Question, pagination.order_by, Question.created_at)
         if pagination.order.lower() == 'desc':
@@ -317,8 +341,20 @@ async def get_questions(
         else:
             query = query.order_by(asc(order_column))
         
-        # Apply pagination
-        questions = query.offset(pagination.skip).limit(pagination.limit).all()
+        # Apply pagination, fetching the total match count alongside the page
+        # with a window function so the listing takes one query instead of two
+        rows = (
+            query.add_columns(func.count().over().label("total"))
+            .offset(pagination.skip)
+            .limit(pagination.limit)
+            .all()
+        )
+        questions = [row[0] for row in rows]
+        if rows:
+            total = rows[0].total
+        else:
+            # Empty page: only a page past the end still needs a real count
+            total = query.count() if pagination.skip else 0
         
         # Prepare response
         response_questions = []
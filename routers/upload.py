@@ -2,6 +2,7 @@ import os
 from fastapi import APIRouter, UploadFile, File, HTTPException, status, Request
 from typing import List, Optional
 import shutil
+import aiofiles
 from pathlib import Path
 from dotenv import load_dotenv
 import re
@@ -87,9 +88,10 @@ async def save_upload_file(upload_file: UploadFile, upload_dir: str, max_image_s
         filename = Path(upload_file.filename).name
         file_path = os.path.join(upload_dir, filename)
         
-        # Save the file using the content we already read
-        with open(file_path, "wb") as buffer:
-            buffer.write(content)
+        # Save the file using the content we already read, without blocking
+        # the event loop on disk I/O
+        async with aiofiles.open(file_path, "wb") as buffer:
+            await buffer.write(content)
             
         return file_path
         
@@ -1,4 +1,5 @@
 import os
+import re
 import shutil
 import json
 from fastapi import APIRouter, UploadFile, File, HTTPException, status, Depends, BackgroundTasks, Query
@@ -17,6 +18,9 @@ from .generate import process_image, process_pdf, get_file_extension
 
 router = APIRouter()
 
+# Locates a JSON array of question objects inside a noisy model response
+JSON_ARRAY_RE = re.compile(r'\[\s*\{.*\}\s*\]', re.DOTALL)
+
 class GenerateRequest(BaseModel):
     qtype: str
     difficulty: str
@@ -138,8 +142,7 @@ async def upload_and_generate(
             try:
                 questions = json.loads(questions)
             except json.JSONDecodeError:
-                import re
-                json_match = re.search(r'\[\s*\{.*\}\s*\]', questions, re.DOTALL)
+                json_match = JSON_ARRAY_RE.search(questions)
                 if json_match:
                     questions = json.loads(json_match.group(0))
                 else:
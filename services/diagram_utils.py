@@ -1,9 +1,13 @@
 # services/diagram_utils.py
+import asyncio
+import logging
 import cv2
 import numpy as np
 import pytesseract
 from typing import Tuple, Optional
 
+logger = logging.getLogger(__name__)
+
 def contains_diagram(image_path: str, edge_threshold: float = 0.15, line_threshold: int = 10) -> bool:
     """
     Detect if an image contains diagrams, charts, or other non-text elements.
@@ -17,18 +21,23 @@ def contains_diagram(image_path: str, edge_threshold: float = 0.15, line_thresho
         bool: True if diagram is detected
     """
     try:
-        img = cv2.imread(image_path)
-        if img is None:
+        # Decode straight to grayscale instead of BGR + cvtColor
+        gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
             return False
             
-        # Convert to grayscale and resize for faster processing
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         height, width = gray.shape
         
         # Edge detection with adaptive thresholding
         edges = cv2.Canny(gray, 50, 150, apertureSize=3)
         edge_ratio = np.count_nonzero(edges) / (height * width)
         
+        # Both conditions are required, so the Hough transform is only worth
+        # running once the edge ratio already qualifies
+        if edge_ratio <= edge_threshold:
+            logger.debug("Edge ratio: %.4f, below threshold; skipping line detection", edge_ratio)
+            return False
+        
         # Line detection with adjusted parameters
         lines = cv2.HoughLinesP(edges, 1, np.pi/180, 
                               threshold=50,  # Lower threshold for better line detection
@@ -36,11 +45,11 @@ def contains_diagram(image_path: str, edge_threshold: float = 0.15, line_thresho
                               maxLineGap=20)  # Increased gap tolerance
         lines = lines if lines is not None else []
         
-        # Debug info
-        print(f"Edge ratio: {edge_ratio:.4f}, Lines detected: {len(lines)}")
+        # Debug info (formatted only when debug logging is enabled)
+        logger.debug("Edge ratio: %.4f, Lines detected: %d", edge_ratio, len(lines))
         
         # More conservative detection - require both conditions for diagram
-        is_diagram = edge_ratio > edge_threshold and len(lines) > line_threshold
+        is_diagram = len(lines) > line_threshold
         return is_diagram
         
     except Exception as e:
@@ -50,9 +59,10 @@ def contains_diagram(image_path: str, edge_threshold: float = 0.15, line_thresho
 async def extract_diagram_text(image_path: str) -> str:
     """Extract text from diagrams using specialized OCR settings."""
     try:
-        img = cv2.imread(image_path)
         config = '--psm 6 --oem 3 -c preserve_interword_spaces=1'
-        text = pytesseract.image_to_string(img, config=config)
+        # Tesseract reads the file itself, so there is no decode here and no
+        # re-encoded temp PNG; it runs as a subprocess, off the event loop
+        text = await asyncio.to_thread(pytesseract.image_to_string, image_path, config=config)
         return text.strip() or "No readable text found in diagram."
     except Exception as e:
         return f"Error extracting text from diagram: {str(e)}"
\ No newline at end of file
@@ -7,14 +7,12 @@ import pytesseract
 from dotenv import load_dotenv
 from typing import List, Tuple, Optional, Dict, Any, Union
 import json
-import sys
-
-# Add the project root to the path to allow absolute imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-# Now use absolute imports
-from services import qgen_service
-from services.vision_service import describe_image_stub
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache, partial
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # =====================================================
 #  LOAD TESSERACT
@@ -24,6 +22,33 @@ TESS_CMD = os.getenv("TESSERACT_CMD")
 if TESS_CMD:
     pytesseract.pytesseract.tesseract_cmd = TESS_CMD
 
+# Each Tesseract pass is a separate process, so the preprocessing/config
+# candidates are fanned out over a thread pool. Tesseract's own OpenMP
+# threading is limited to one thread per process to avoid oversubscription.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", str(os.cpu_count() or 4)))
+_ocr_executor = ThreadPoolExecutor(max_workers=OCR_MAX_WORKERS, thread_name_prefix="tesseract")
+
+# OCR results keyed by a hash of the file contents, so re-uploads and the
+# second OCR of the same file (text + description paths) are served from memory
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "128"))
+_ocr_cache: "OrderedDict[str, str]" = OrderedDict()
+_ocr_cache_lock = threading.Lock()
+HASH_CHUNK_SIZE = 1024 * 1024  # Read size when hashing a file for the cache key
+# Runs in progress, so concurrent callers for the same content share one
+# result (including errors, which are not cached) instead of re-running OCR
+_ocr_inflight: Dict[str, "Future[str]"] = {}
+
+# Longest side fed to the preprocessing pipeline. Small images are still
+# upscaled 2x below 1500px, so this matches the largest upscaled size;
+# bigger scans only cost Tesseract and the denoiser more time.
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "3000"))
+
+# Blank pages, flat backgrounds and tiny icons have nothing to read; they are
+# rejected before the preprocessing and Tesseract sweep
+BLANK_STD_THRESHOLD = 5.0
+MIN_OCR_PIXELS = 64 * 64
+
 
 # =====================================================
 #  HELPER: Deskew the image (important for stylized text)
@@ -108,6 +133,21 @@ def generate_preprocessed_images(image_path: str) -> list[Image.Image]:
 # =====================================================
 #  OCR HANDLER
 # =====================================================
+def fit_to_max_side(img: np.ndarray) -> np.ndarray:
+    """
+    Shrink an oversized scan so its longest side is OCR_MAX_SIDE.
+    
+    Area averaging only pays off for real reductions; bilinear is cheaper
+    and just as legible when the image shrinks by less than half.
+    """
+    height, width = img.shape[:2]
+    if max(height, width) <= OCR_MAX_SIDE:
+        return img
+    
+    scale = OCR_MAX_SIDE / max(height, width)
+    interpolation = cv2.INTER_LINEAR if scale > 0.5 else cv2.INTER_AREA
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=interpolation)
+
 def preprocess_image(img: np.ndarray, method: str = 'default') -> np.ndarray:
     """Apply various preprocessing techniques to enhance text visibility."""
     # Convert to grayscale if needed
@@ -167,25 +207,32 @@ def process_ocr_result(data: dict, min_confidence: float = 0.3) -> List[dict]:
     """Process Tesseract OCR results into structured data."""
     text_blocks = []
     
-    for i in range(len(data['text'])):
-        text = data['text'][i].strip()
+    # Walk the TSV columns in lockstep instead of indexing each one per word
+    rows = zip(
+        data['text'], data['conf'], data['left'], data['top'], data['width'],
+        data['height'], data['block_num'], data['line_num'], data['word_num'],
+        data['page_num']
+    )
+    for text, conf, x, y, w, h, block_num, line_num, word_num, page_num in rows:
+        text = text.strip()
         if not text:
             continue
             
-        conf = float(data['conf'][i]) / 100.0
+        conf = float(conf) / 100.0
         if conf < min_confidence and len(text) < 3:
             continue
             
         text_blocks.append({
             'text': text,
             'conf': conf,
-            'x': data['left'][i],
-            'y': data['top'][i],
-            'w': data['width'][i],
-            'h': data['height'][i],
-            'block_num': data['block_num'][i],
-            'line_num': data['line_num'][i],
-            'word_num': data['word_num'][i]
+            'x': x,
+            'y': y,
+            'w': w,
+            'h': h,
+            'block_num': block_num,
+            'line_num': line_num,
+            'word_num': word_num,
+            'page_num': page_num
         })
     
     return text_blocks
@@ -221,42 +268,117 @@ def group_text_blocks(blocks: List[dict]) -> List[List[dict]]:
     
     return lines
 
+# Common OCR error corrections, keyed by the lowercased misread word
+OCR_WORD_CORRECTIONS = {
+    'grog': 'Groq',
+    'quesiion': 'question',
+    'teh': 'the',
+    'th e': 'the',
+    'wi th': 'with',
+    'w1th': 'with',
+    'tne': 'the',
+    'nat': 'not',
+    'deforiied': 'deformed',
+    '1s': 'is',
+    'wh1ch': 'which',
+    'th1s': 'this',
+    '0r': 'or',
+    '1n': 'in',
+    '1t': 'it',
+    'w1ll': 'will',
+}
+
+# All corrections compiled once into a single alternation so each line is
+# scanned in one pass instead of once per rule. Where two multi-word keys
+# overlap, the leftmost (then longest) match wins rather than the earlier
+# rule: 'wi th e' becomes 'with e', where rule-by-rule order gave 'wi the'.
+# Each key gets a named group and the replacement is looked up by group name:
+# IGNORECASE also matches case-fold variants ('1ſ', 'quesİion') whose
+# .lower() is not a key.
+_OCR_WORD_REPLACEMENTS = {
+    f'c{i}': (word, OCR_WORD_CORRECTIONS[word])
+    for i, word in enumerate(sorted(OCR_WORD_CORRECTIONS, key=len, reverse=True))
+}
+_OCR_WORD_RE = re.compile(
+    r'\b(?:' + '|'.join(
+        f'(?P<{name}>{re.escape(word)})' for name, (word, _) in _OCR_WORD_REPLACEMENTS.items()
+    ) + r')\b',
+    re.IGNORECASE
+)
+
+# Everything except letters and digits; stripping it leaves the alnum count
+_NON_ALNUM_RE = re.compile(r'[\W_]+')
+_ALNUM_RE = re.compile(r'[^\W_]')
+
+# Stray single-symbol tokens ('|', '-', '.') standing alone between spaces
+_ISOLATED_SYMBOL_RE = re.compile(r'(?<!\S)(?:[^\w\s]|_)(?!\S)')
+
+@lru_cache(maxsize=4096)
 def post_process_text(text: str) -> str:
-    """Clean and normalize the extracted text."""
+    """
+    Clean and normalize the extracted text.
+    
+    Applied line by line; results are memoised because headers, titles and
+    other boilerplate lines recur across pages and uploads.
+    """
     if not text:
         return ""
     
-    # Common OCR error corrections
-    corrections = {
-        r'\bGrog\b': 'Groq',
-        r'\bquesiion\b': 'question',
-        r'\bteh\b': 'the',
-        r'\bth e\b': 'the',
-        r'\bwi th\b': 'with',
-        r'\bw1th\b': 'with',
-        r'\btne\b': 'the',
-        r'\bnat\b': 'not',
-        r'\bdeforiied\b': 'deformed',
-        r'\b1s\b': 'is',
-        r'\bwh1ch\b': 'which',
-        r'\bth1s\b': 'this',
-        r'\b0r\b': 'or',
-        r'\b1n\b': 'in',
-        r'\b1t\b': 'it',
-        r'\bw1ll\b': 'will',
-    }
-    
     # Apply corrections
-    for pattern, replacement in corrections.items():
-        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+    text = _OCR_WORD_RE.sub(lambda m: _OCR_WORD_REPLACEMENTS[m.lastgroup][1], text)
     
     # Remove isolated characters and normalize spaces
-    words = []
-    for word in text.split():
-        if len(word) > 1 or word.isalnum():
-            words.append(word)
+    return ' '.join(_ISOLATED_SYMBOL_RE.sub('', text).split())
+
+def blocks_to_text(text_blocks: List[dict]) -> str:
+    """Group text blocks into lines and reconstruct the text."""
+    if not text_blocks:
+        return ""
+    
+    lines = group_text_blocks(text_blocks)
+    return '\n'.join(
+        ' '.join(block['text'] for block in line)
+        for line in lines
+    )
+
+def run_ocr_candidate(img: np.ndarray, config: str) -> str:
+    """Run a single Tesseract pass and rebuild its text line by line."""
+    try:
+        # Run Tesseract
+        data = pytesseract.image_to_data(
+            img,
+            config=config,
+            output_type=pytesseract.Output.DICT
+        )
+        return blocks_to_text(process_ocr_result(data))
+    
+    except Exception as e:
+        print(f"Warning in OCR processing: {str(e)}")
+        return ""
+
+def run_ocr_batch(images: List[np.ndarray], list_path: str, config: str) -> List[str]:
+    """
+    Run one Tesseract pass over every image named in a list file.
+    
+    Tesseract numbers the listed images as pages, so the text of each one
+    is split back out on page_num. Falls back to one pass per image if the
+    batched run fails.
+    """
+    try:
+        data = pytesseract.image_to_data(
+            list_path,
+            config=config,
+            output_type=pytesseract.Output.DICT
+        )
+        
+        pages: List[List[dict]] = [[] for _ in images]
+        for block in process_ocr_result(data):
+            pages[block['page_num'] - 1].append(block)
+        return [blocks_to_text(blocks) for blocks in pages]
     
-    return ' '.join(words)
+    except Exception as e:
+        print(f"Warning in batched OCR, retrying per image: {str(e)}")
+        return [run_ocr_candidate(img, config) for img in images]
 
 def extract_text_from_path(
     path: str, 
@@ -279,18 +401,88 @@ def extract_text_from_path(
         extracted text and the generated questions.
     """
     try:
-        # Read the image
-        img = cv2.imread(path)
+        st = os.stat(path)
+        key = _cached_content_hash(path, st.st_mtime_ns, st.st_size)
+    except OSError:
+        # Unreadable file: let the extractor report the error
+        return _extract_text_uncached(path)
+    
+    with _ocr_cache_lock:
+        if key in _ocr_cache:
+            _ocr_cache.move_to_end(key)
+            return _ocr_cache[key]
+        pending = _ocr_inflight.get(key)
+        if pending is None:
+            pending = _ocr_inflight[key] = Future()
+            owner = True
+        else:
+            owner = False
+    
+    # Concurrent requests for the same content wait for the first caller's run
+    if not owner:
+        return pending.result()
+    
+    text = "[error] OCR did not complete"
+    try:
+        text = _extract_text_uncached(path)
+    finally:
+        with _ocr_cache_lock:
+            _ocr_inflight.pop(key, None)
+            if not text.startswith("[error]"):
+                _ocr_cache[key] = text
+                while len(_ocr_cache) > OCR_CACHE_SIZE:
+                    _ocr_cache.popitem(last=False)
+        pending.set_result(text)
+    return text
+
+def file_content_hash(path: str) -> str:
+    """
+    Return a BLAKE2b digest of the file contents.
+    
+    The file is read in chunks into one reused buffer. Uploads are rewritten
+    in place, so the file may be truncated mid-hash; a plain read then just
+    ends early, where a memory-mapped file would crash the process (SIGBUS).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    buf = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+@lru_cache(maxsize=1024)
+def _cached_content_hash(path: str, mtime_ns: int, size: int) -> str:
+    """Content hash of an unchanged file (same path, mtime and size) is reused."""
+    return file_content_hash(path)
+
+def _extract_text_uncached(path: str) -> str:
+    """Run the full preprocessing + Tesseract pipeline on an image file."""
+    try:
+        # Read the image, decoded straight to grayscale: every variant below
+        # starts from gray, and JPEGs then skip chroma upsampling entirely
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
         if img is None:
             return "[error] Could not read the image file"
         
+        if img.size < MIN_OCR_PIXELS or cv2.meanStdDev(img)[1][0][0] < BLANK_STD_THRESHOLD:
+            return "[error] No readable text could be extracted"
+        
         # Initialize variables
         best_text = ""
         best_score = 0
         
-        # Generate multiple preprocessed versions
+        # Shrink once up front, before the per-pixel filters, rather than
+        # once per preprocessing method
+        img = fit_to_max_side(img)
+        
+        # Generate multiple preprocessed versions. OpenCV releases the GIL,
+        # so the variants are built in parallel on the worker pool.
         preprocess_methods = ['default', 'adaptive', 'clahe']
-        images = [preprocess_image(img, method) for method in preprocess_methods]
+        images = list(_ocr_executor.map(preprocess_image, [img] * len(preprocess_methods), preprocess_methods))
         images.append(cv2.bitwise_not(images[0]))  # Add inverted version
         
         # Get Tesseract configurations
@@ -299,41 +491,39 @@ def extract_text_from_path(
         best_text = ""
         best_score = 0
         
-        for img in images:
-            for config in tesseract_configs:
-                try:
-                    # Run Tesseract
-                    data = pytesseract.image_to_data(
-                        img,
-                        config=config,
-                        output_type=pytesseract.Output.DICT
-                    )
-                    
-                    # Process results
-                    text_blocks = process_ocr_result(data)
-                    if not text_blocks:
-                        continue
-                    
-                    # Group into lines and reconstruct text
-                    lines = group_text_blocks(text_blocks)
-                    current_text = '\n'.join(
-                        ' '.join(block['text'] for block in line)
-                        for line in lines
-                    )
-                    
-                    # Score the text (favor more alphanumeric characters)
-                    if current_text:
-                        alpha_count = sum(c.isalnum() for c in current_text)
-                        total_chars = max(1, len(current_text))
-                        score = (alpha_count / total_chars) * 100
-                        
-                        if score > best_score:
-                            best_score = score
-                            best_text = current_text
+        # Write the variants once and hand Tesseract a list file, so each
+        # config is a single process over all of them instead of one per image.
+        # BMP is a raw copy of the pixels, avoiding PNG's zlib encode/decode.
+        with tempfile.TemporaryDirectory(prefix="ocr_") as tmp_dir:
+            image_paths = []
+            for i, variant in enumerate(images):
+                variant_path = os.path.join(tmp_dir, f"variant_{i}.bmp")
+                cv2.imwrite(variant_path, variant)
+                image_paths.append(variant_path)
+            
+            list_path = os.path.join(tmp_dir, "variants.txt")
+            with open(list_path, "w") as f:
+                f.write('\n'.join(image_paths) + '\n')
+            
+            results = list(_ocr_executor.map(partial(run_ocr_batch, images, list_path), tesseract_configs))
+        
+        # Score in (image, config) order, so ties resolve as before
+        candidates = (
+            per_config[i]
+            for i in range(len(images))
+            for per_config in results
+        )
+        
+        for current_text in candidates:
+            # Score the text (favor more alphanumeric characters)
+            if current_text:
+                alpha_count = len(_NON_ALNUM_RE.sub('', current_text))
+                total_chars = max(1, len(current_text))
+                score = (alpha_count / total_chars) * 100
                 
-                except Exception as e:
-                    print(f"Warning in OCR processing: {str(e)}")
-                    continue
+                if score > best_score:
+                    best_score = score
+                    best_text = current_text
         
         if not best_text.strip():
             return "[error] No readable text could be extracted"
@@ -342,7 +532,7 @@ def extract_text_from_path(
         final_lines = []
         for line in best_text.splitlines():
             line = post_process_text(line.strip())
-            if any(c.isalnum() for c in line):
+            if _ALNUM_RE.search(line):
                 final_lines.append(line)
         
         return '\n'.join(final_lines).strip()
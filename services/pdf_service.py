@@ -1,9 +1,39 @@
+import asyncio
 import fitz  # PyMuPDF
 from pdf2image import convert_from_path
 import os
-from typing import List, Tuple
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional
 from pathlib import Path
 
+# Text-layer extraction holds the GIL, so long documents are split into page
+# ranges and read in worker processes. Short ones aren't worth the hand-off.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", str(os.cpu_count() or 4)))
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+_pdf_executor_lock = threading.Lock()
+
+
+def _get_pdf_executor() -> ProcessPoolExecutor:
+    """Create the worker pool on first use; 'spawn' keeps the server's threads out of the children."""
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            _pdf_executor = ProcessPoolExecutor(
+                max_workers=PDF_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_executor
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> str:
+    """Extract the text of pages [start, stop) in a worker process."""
+    with fitz.open(pdf_path) as doc:
+        return "".join(page.get_text() for page in doc.pages(start, stop))
+
+
 class PDFService:
     @staticmethod
     async def pdf_to_images(pdf_path: str, output_dir: str = "temp_images") -> List[str]:
@@ -11,23 +41,33 @@ class PDFService:
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
         
-        # Convert PDF to images
-        images = convert_from_path(pdf_path)
-        image_paths = []
+        # Convert PDF to images, split across pdftoppm processes and off the event loop
+        images = await asyncio.to_thread(convert_from_path, pdf_path, thread_count=PDF_MAX_WORKERS)
+        image_paths = [os.path.join(output_dir, f"page_{i+1}.jpg") for i in range(len(images))]
         
-        # Save each page as an image
-        for i, image in enumerate(images):
-            image_path = os.path.join(output_dir, f"page_{i+1}.jpg")
-            image.save(image_path, "JPEG")
-            image_paths.append(image_path)
+        # Save each page as an image; Pillow's JPEG encoder releases the GIL
+        await asyncio.gather(*(
+            asyncio.to_thread(image.save, image_path, "JPEG")
+            for image, image_path in zip(images, image_paths)
+        ))
             
         return image_paths
 
     @staticmethod
     def extract_text_from_pdf(pdf_path: str) -> str:
         """Extract text directly from PDF"""
-        text = ""
         with fitz.open(pdf_path) as doc:
-            for page in doc:
-                text += page.get_text()
-        return text
\ No newline at end of file
+            page_count = doc.page_count
+            if page_count < PDF_PARALLEL_MIN_PAGES or PDF_MAX_WORKERS < 2:
+                return "".join(page.get_text() for page in doc)
+
+        # One contiguous range per worker, joined back in page order
+        chunk = -(-page_count // PDF_MAX_WORKERS)
+        starts = range(0, page_count, chunk)
+        executor = _get_pdf_executor()
+        return "".join(executor.map(
+            _extract_page_range,
+            [pdf_path] * len(starts),
+            starts,
+            [min(start + chunk, page_count) for start in starts]
+        ))
@@ -12,44 +12,12 @@ groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 # Model configuration
 MODEL_NAME = "llama-3.1-8b-instant"  # Using Groq's LLaMA 3 70B model
 
+SYSTEM_PROMPT = "You are a helpful assistant that generates educational questions in JSON format. Follow all instructions precisely."
 
-def build_prompt(
-    text: str, 
-    refined_text: str, 
-    description: str, 
-    qtype: str, 
-    difficulty: str, 
-    num_questions: int = 3,
-    class_for: str = None,
-    subject: str = None
-) -> str:
-    """
-    Build a prompt for question generation using Groq.
-    
-    Args:
-        text: The original text content
-        refined_text: The text after OCR processing and refinement
-        description: Description of the image (if any)
-        qtype: Type of questions to generate
-        difficulty: Difficulty level
-        num_questions: Number of questions to generate
-        class_for: The class/grade level the questions are for (e.g., 'Grade 5')
-        subject: The subject of the questions (e.g., 'Math', 'Science')
-    """
-    # Add class and subject context to the prompt
-    context_parts = []
-    if class_for:
-        context_parts.append(f"Class/Grade: {class_for}")
-    if subject:
-        context_parts.append(f"Subject: {subject}")
-    
-    context = "\n".join(context_parts)
-    if context:
-        context = f"CONTEXT:\n{context}\n\n"
 
-    # Define question type specific instructions
-    qtype_instructions = {
-        'mcq': """
+# Question type specific instructions
+QTYPE_INSTRUCTIONS = {
+    'mcq': """
 MULTIPLE CHOICE (MCQ) QUESTIONS - FOLLOW THESE RULES STRICTLY:
 
 1. YOU MUST RETURN A JSON ARRAY OF QUESTION OBJECTS.
@@ -87,7 +55,7 @@ MULTIPLE CHOICE (MCQ) QUESTIONS - FOLLOW THESE RULES STRICTLY:
    - Each choice should be a complete sentence or phrase
    - The rationale should explain why the answer is correct
 """,
-        'true_false': """
+    'true_false': """
 TRUE/FALSE QUESTIONS - FOLLOW THESE RULES:
 
 1. RETURN A JSON ARRAY OF QUESTION OBJECTS
@@ -107,7 +75,7 @@ EXAMPLE:
 ]
 ```
 """,
-        'short_answer': """
+    'short_answer': """
 SHORT ANSWER QUESTIONS - FOLLOW THESE RULES:
 
 1. RETURN A JSON ARRAY OF QUESTION OBJECTS
@@ -127,14 +95,61 @@ EXAMPLE:
 ]
 ```
 """
-    }
+}
+
+# Difficulty-specific instructions
+DIFFICULTY_INSTRUCTIONS = {
+    'easy': "Use simple language and focus on basic concepts. Questions should test recall and basic understanding.",
+    'medium': "Include some complexity in the questions and answers. Test application of concepts.",
+    'hard': "Create challenging questions that require analysis, evaluation, or synthesis of information."
+}
+
+# Example response per question type, sliced out of the instructions once
+QTYPE_EXAMPLES = {
+    qtype: (
+        instructions.split('EXAMPLE:')[-1].split('```json')[-1].split('```')[0].strip()
+        if 'EXAMPLE:' in instructions else '[]'
+    )
+    for qtype, instructions in QTYPE_INSTRUCTIONS.items()
+}
+
 
-    # Add difficulty-specific instructions
-    difficulty_instructions = {
-        'easy': "Use simple language and focus on basic concepts. Questions should test recall and basic understanding.",
-        'medium': "Include some complexity in the questions and answers. Test application of concepts.",
-        'hard': "Create challenging questions that require analysis, evaluation, or synthesis of information."
-    }
+def build_prompt(
+    text: str, 
+    refined_text: str, 
+    description: str, 
+    qtype: str, 
+    difficulty: str, 
+    num_questions: int = 3,
+    class_for: str = None,
+    subject: str = None
+) -> str:
+    """
+    Build a prompt for question generation using Groq.
+    
+    Args:
+        text: The original text content
+        refined_text: The text after OCR processing and refinement
+        description: Description of the image (if any)
+        qtype: Type of questions to generate
+        difficulty: Difficulty level
+        num_questions: Number of questions to generate
+        class_for: The class/grade level the questions are for (e.g., 'Grade 5')
+        subject: The subject of the questions (e.g., 'Math', 'Science')
+    """
+    # Add class and subject context to the prompt
+    context_parts = []
+    if class_for:
+        context_parts.append(f"Class/Grade: {class_for}")
+    if subject:
+        context_parts.append(f"Subject: {subject}")
+    
+    context = "\n".join(context_parts)
+    if context:
+        context = f"CONTEXT:\n{context}\n\n"
+
+    instructions = QTYPE_INSTRUCTIONS.get(qtype, '')
+    example = QTYPE_EXAMPLES.get(qtype, '[]')
 
     return f"""{context}You are an expert educational content creator. Generate EXACTLY {num_questions} high-quality {qtype} questions at {difficulty} difficulty level for {class_for} in {subject}.
 
@@ -144,10 +159,10 @@ IMPORTANT INSTRUCTIONS - READ CAREFULLY:
    - REFINED TEXT: {refined_text[:1000] if refined_text else 'N/A'}{'...' if refined_text and len(refined_text) > 1000 else ''}
    - IMAGE DESCRIPTION: {description if description else 'N/A'}
 
-2. DIFFICULTY LEVEL: {difficulty_instructions.get(difficulty, '')}
+2. DIFFICULTY LEVEL: {DIFFICULTY_INSTRUCTIONS.get(difficulty, '')}
 
 3. QUESTION TYPE REQUIREMENTS:
-{qtype_instructions.get(qtype, '')}
+{instructions}
 
 4. RESPONSE FORMAT REQUIREMENTS:
    - Respond ONLY with a valid JSON array of question objects
@@ -163,7 +178,7 @@ IMPORTANT INSTRUCTIONS - READ CAREFULLY:
    - Be properly escaped and formatted
 
 6. EXAMPLE OF A VALID RESPONSE (for {qtype}):
-{qtype_instructions.get(qtype, '').split('EXAMPLE:')[-1].split('```json')[-1].split('```')[0].strip() if 'EXAMPLE:' in qtype_instructions.get(qtype, '') else '[]'}
+{example}
 """
 
 
@@ -220,21 +235,24 @@ def generate_questions_from_content(
         
     prompt = build_prompt(text, refined_text, description, qtype, difficulty, num_questions)
     
+    # The request is identical on every attempt, so build it once
+    messages = [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+    
     for attempt in range(max_retries + 1):
         try:
             # Call Groq API
             completion = groq_client.chat.completions.create(
                 model=MODEL_NAME,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that generates educational questions in JSON format. Follow all instructions precisely."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
+                messages=messages,
                 temperature=0.3,
                 max_tokens=2048,
                 top_p=0.9,
@@ -316,6 +334,10 @@ def generate_questions_from_content(
                     continue
                     
                 processed_questions.append(processed_q)
+                
+                # Anything past the requested count is dropped anyway
+                if len(processed_questions) == num_questions:
+                    break
             
             return json.dumps(processed_questions[:num_questions])
                 
@@ -1,13 +1,20 @@
 # services/vision_service.py
 import os
+import asyncio
 import base64
+import io
+import random
+import re
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 from dotenv import load_dotenv
-from groq import Groq
+from PIL import Image
+from groq import Groq, RateLimitError, InternalServerError, APIConnectionError
 
 from services.diagram_utils import contains_diagram, extract_diagram_text
-from typing import Optional
 
 # Load environment variables
 load_dotenv()
@@ -15,64 +22,160 @@ load_dotenv()
 # Configuration
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 MODEL_NAME = "llama-3.1-8b-instant"  # Using a supported Groq model
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))  # In-flight request cap
+GROQ_MAX_ATTEMPTS = 3  # Total attempts for rate-limited / transient failures
+GROQ_MAX_BACKOFF = 30  # Upper bound for the retry delay in seconds
+PNG_REENCODE_THRESHOLD = 200 * 1024  # PNGs above this are sent as JPEG
+GROQ_KEEPALIVE_EXPIRY = 60  # Seconds an idle pooled connection is kept open
+MIN_REFINE_LENGTH = 50  # Shorter OCR texts are returned without refinement
+REFINE_MAX_TOKENS = 2000  # Upper bound on the refinement output length
 
 # Validate API key
 if not GROQ_API_KEY:
     raise ValueError("GROQ_API_KEY not found in environment variables")
 
-# Initialize Groq client
-client = Groq(api_key=GROQ_API_KEY)
+# Initialize Groq client (retries are handled by create_completion below).
+# The pool is sized to the concurrency cap and idle connections are kept
+# alive, so back-to-back calls skip the TCP/TLS handshake.
+client = Groq(
+    api_key=GROQ_API_KEY,
+    max_retries=0,
+    http_client=httpx.Client(
+        limits=httpx.Limits(
+            max_connections=GROQ_MAX_CONCURRENCY,
+            max_keepalive_connections=GROQ_MAX_CONCURRENCY,
+            keepalive_expiry=GROQ_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    ),
+)
 
-async def refine_ocr_text(text: str) -> str:
+# Static prompt parts for OCR refinement, built once at import time; only
+# the OCR text is appended per request
+REFINE_SYSTEM_PROMPT = (
+    "You are a text cleaning assistant that fixes OCR errors. "
+    "Your task is to correct common OCR mistakes while preserving the original meaning and structure.\n"
+    "GUIDELINES:\n"
+    "1. Fix only obvious OCR errors (e.g., 'nat' → 'not', 'tne' → 'the', 'w1th' → 'with')\n"
+    "2. Preserve proper nouns, names, and specialized terminology\n"
+    "3. Maintain original punctuation and formatting\n"
+    "4. Do NOT add any new information or change the meaning\n"
+    "5. Return ONLY the corrected text, with no additional commentary"
+)
+REFINE_USER_PREFIX = (
+    "Please correct any OCR errors in the following text while preserving its original meaning and structure. "
+    "Return ONLY the corrected text with no additional commentary.\n\nTEXT TO CORRECT:\n"
+)
+
+# Typical OCR noise: letters and digits mixed in one token ('w1th', 'f00d')
+# or very long lowercase runs where word spacing was lost
+_OCR_NOISE_RE = re.compile(r'\b(?=[A-Za-z]*\d)(?=\d*[A-Za-z])[A-Za-z\d]+\b|\b[a-z]{15,}\b')
+
+# Markdown fences and echoed prompt markers stripped from refinement output
+_REFINE_ARTIFACTS_RE = re.compile(r'```|TEXT TO CORRECT:')
+
+# Errors worth retrying instead of falling back to raw OCR output
+_RETRYABLE_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+
+# Groq calls get their own pool, sized to the concurrency cap: queued calls
+# wait in its queue instead of holding threads of the default executor that
+# OCR and file I/O run on, and it works from any event loop
+_groq_executor = ThreadPoolExecutor(max_workers=GROQ_MAX_CONCURRENCY, thread_name_prefix="groq")
+
+def _create_completion_sync(**kwargs):
+    return client.chat.completions.create(**kwargs)
+
+def _stream_completion_sync(**kwargs) -> Tuple[str, Optional[str]]:
+    parts = []
+    finish_reason = None
+    # Closing the stream returns its pooled connection even if reading fails
+    with client.chat.completions.create(stream=True, **kwargs) as stream:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            parts.append(choice.delta.content or '')
+            finish_reason = choice.finish_reason or finish_reason
+    return ''.join(parts), finish_reason
+
+async def _call_with_retries(func, **kwargs):
+    """
+    Run a blocking Groq call on the Groq worker pool without blocking the event loop.
+    
+    Rate limits, 5xx responses and connection errors are retried with
+    exponential backoff and jitter; the number of in-flight requests is
+    capped at GROQ_MAX_CONCURRENCY.
+    """
+    for attempt in range(1, GROQ_MAX_ATTEMPTS + 1):
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_groq_executor, partial(func, **kwargs))
+        except _RETRYABLE_ERRORS as e:
+            if attempt == GROQ_MAX_ATTEMPTS:
+                raise
+            delay = min(GROQ_MAX_BACKOFF, 2 ** (attempt - 1)) + random.uniform(0, 1)
+            print(f"Groq request failed ({type(e).__name__}), retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+
+async def create_completion(**kwargs):
+    """Create a Groq chat completion (see _call_with_retries)."""
+    return await _call_with_retries(_create_completion_sync, **kwargs)
+
+async def stream_completion_text(**kwargs) -> Tuple[str, Optional[str]]:
+    """Stream a Groq chat completion and return the message text and its finish_reason."""
+    return await _call_with_retries(_stream_completion_sync, **kwargs)
+
+async def refine_ocr_text(text: str, force: bool = False) -> str:
     """
     Refines the OCR-extracted text using the Groq model to correct errors
     and improve readability while preserving the original content.
     Uses context-aware correction without hardcoded replacements.
+    
+    Very short texts and texts without typical OCR noise are returned as-is
+    to skip the network round trip; pass force=True to always refine.
     """
+    if not force and (len(text) < MIN_REFINE_LENGTH or not _OCR_NOISE_RE.search(text)):
+        return text
+    
     try:
-        response = client.chat.completions.create(
+        # Stream the response so tokens are collected as they are generated
+        content, finish_reason = await stream_completion_text(
             model=MODEL_NAME,
             messages=[
                 {
                     "role": "system", 
-                    "content": "You are a text cleaning assistant that fixes OCR errors. "
-                             "Your task is to correct common OCR mistakes while preserving the original meaning and structure.\n"
-                             "GUIDELINES:\n"
-                             "1. Fix only obvious OCR errors (e.g., 'nat' → 'not', 'tne' → 'the', 'w1th' → 'with')\n"
-                             "2. Preserve proper nouns, names, and specialized terminology\n"
-                             "3. Maintain original punctuation and formatting\n"
-                             "4. Do NOT add any new information or change the meaning\n"
-                             "5. Return ONLY the corrected text, with no additional commentary"
+                    "content": REFINE_SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
-                    "content": f"Please correct any OCR errors in the following text while preserving its original meaning and structure. Return ONLY the corrected text with no additional commentary.\n\nTEXT TO CORRECT:\n{text}"
+                    "content": REFINE_USER_PREFIX + text
                 }
             ],
             temperature=0.1,  # Low temperature for consistent, minimal changes
             top_p=0.9,       # Slightly higher top_p for better handling of OCR errors
-            max_tokens=2000,
+            # The output is roughly as long as the input; noisy OCR text can run
+            # under 3 chars per token, so budget ~2 chars per token plus headroom
+            max_tokens=min(REFINE_MAX_TOKENS, len(text) // 2 + 256),
         )
         
-        if response.choices and len(response.choices) > 0:
-            # Extract the cleaned text
-            cleaned_text = response.choices[0].message.content.strip()
-            
-            # Basic post-processing to ensure clean output
-            cleaned_text = (
-                cleaned_text
-                .replace('```', '')  # Remove markdown code blocks
-                .replace('TEXT TO CORRECT:', '')  # Remove any prompt artifacts
-                .strip()
-            )
+        if finish_reason == "length":
+            # A truncated correction would silently drop the end of the text
+            print("OCR refinement hit the token limit; using the original text")
+            return text
+        
+        if content:
+            # Remove markdown code blocks and prompt artifacts in one pass
+            cleaned_text = _REFINE_ARTIFACTS_RE.sub('', content).strip()
             
             # If the model somehow added commentary, try to extract just the corrected text
-            lines = cleaned_text.split('\n')
-            if len(lines) > 1 and ':' in lines[0]:
+            first_line, newline, rest = cleaned_text.partition('\n')
+            if newline and ':' in first_line:
                 # If the first line looks like a header (e.g., 'Corrected text:'), skip it
-                return '\n'.join(lines[1:]).strip()
+                return rest.strip()
             
-            return cleaned_text.strip() or text  # Fallback to original if empty
+            return cleaned_text or text  # Fallback to original if empty
+        
+        return text
         
     except Exception as e:
         print(f"Error refining OCR text: {str(e)}")
@@ -80,13 +183,13 @@ async def refine_ocr_text(text: str) -> str:
 
 async def describe_image_groq(image_path: str) -> str:
     """
-    Extracts and refines text from an image using OCR and Groq.
+    Enhanced image description that handles both text and diagrams.
     
     Args:
         image_path: Path to the image file
         
     Returns:
-        str: Both original and refined text from the image
+        str: Formatted string with extracted text and/or diagram description
     """
     if not os.path.exists(image_path):
         return f"Error: Image file not found at {os.path.abspath(image_path)}"
@@ -94,32 +197,63 @@ async def describe_image_groq(image_path: str) -> str:
     try:
         from services.ocr_service import extract_text_from_path
         
-        print("Extracting text from image...")
-        # First, extract text using OCR
-        extracted_text = extract_text_from_path(image_path)
-        
-        if not extracted_text or extracted_text.startswith("[error]"):
-            raise ValueError(f"Failed to extract text from image: {extracted_text}")
-        
-        # Make a copy of the original text for output
-        original_text = extracted_text.strip()
-        
-        print("Refining extracted text...")
-        # Refine the OCR text to fix common errors
-        refined_text = await refine_ocr_text(extracted_text)
-        
-        # Return both original and refined text with clear separation
-        return f"ORIGINAL TEXT:\n{'-'*40}\n{original_text}\n\n\nREFINED TEXT:\n{'-'*40}\n{refined_text.strip()}"
+        # Check if image contains diagrams (cached for retries/repeat uploads).
+        # Detection and OCR are CPU-bound, so they run in worker threads to
+        # keep the event loop free for other requests and Groq calls.
+        st = os.stat(image_path)
+        if await asyncio.to_thread(_contains_diagram_cached, image_path, st.st_mtime_ns, st.st_size):
+            print("Diagram detected in image, using specialized processing...")
+            # Start the diagram description first; it does not depend on the
+            # OCR output, so it runs while the text is extracted and refined
+            desc_task = asyncio.create_task(describe_with_groq(
+                image_path,
+                "Describe this diagram in detail, including the type of diagram, "
+                "key elements, and their relationships. Be factual and objective."
+            ))
             
-    except Exception as e:
-        error_msg = f"[Error] {str(e)}"
-        print(error_msg)
-        raise  # Re-raise to trigger fallback
+            extracted_text = await extract_diagram_text(image_path)
+            refined_text, diagram_desc = await asyncio.gather(
+                refine_ocr_text(extracted_text),
+                desc_task,
+                return_exceptions=True
+            )
+            if isinstance(refined_text, BaseException):
+                raise refined_text
+            if isinstance(diagram_desc, BaseException):
+                print(f"Diagram description error: {str(diagram_desc)}")
+                diagram_desc = "Could not generate description for the diagram."
+            
+            return (
+                "DIAGRAM DETECTED\n"
+                "---------------\n"
+                f"ORIGINAL TEXT:\n{'-'*40}\n{extracted_text}\n\n"
+                f"REFINED TEXT:\n{'-'*40}\n{refined_text}\n\n"
+                f"DIAGRAM DESCRIPTION:\n{'-'*40}\n{diagram_desc}\n"
+                "--------------\n"
+            )
+        else:
+            # Standard text extraction
+            print("Processing as standard text image...")
+            extracted_text = await asyncio.to_thread(extract_text_from_path, image_path)
+            if not extracted_text or extracted_text.startswith("[error]"):
+                # Report the OCR failure as the description; raising would make
+                # describe_image_stub's fallback run the same failed sweep again
+                refined_text = "[Refinement not available - no text extracted]"
+            else:
+                refined_text = await refine_ocr_text(extracted_text)
+            
+            return (
+                "TEXT EXTRACTION\n"
+                "--------------\n"
+                f"ORIGINAL TEXT:\n{'-'*40}\n{extracted_text}\n\n"
+                
+                f"REFINED TEXT:\n{'-'*40}\n{refined_text}\n\n"
+            )
             
     except Exception as e:
-        error_msg = f"[Groq Error] {str(e)}"
+        error_msg = f"[Error] {str(e)}"
         print(error_msg)
-        raise  # Re-raise to trigger fallback
+        raise
 
 async def describe_image_stub(path: str) -> str:
     """
@@ -138,9 +272,7 @@ async def describe_image_stub(path: str) -> str:
         try:
             from services.ocr_service import extract_text_from_path
             # Since extract_text_from_path is synchronous, run it in a thread
-            import asyncio
-            loop = asyncio.get_event_loop()
-            extracted_text = await loop.run_in_executor(None, extract_text_from_path, path)
+            extracted_text = await asyncio.to_thread(extract_text_from_path, path)
             if not extracted_text:
                 raise ValueError("No text could be extracted")
                 
@@ -153,7 +285,6 @@ def describe_image_stub_sync(path: str) -> str:
     """
     Synchronous version of describe_image_stub for use in non-async contexts.
     """
-    import asyncio
     try:
         return asyncio.run(describe_image_stub(path))
     except RuntimeError as e:
@@ -161,76 +292,63 @@ def describe_image_stub_sync(path: str) -> str:
         loop = asyncio.get_event_loop()
         return loop.run_until_complete(describe_image_stub(path))
 
+@lru_cache(maxsize=256)
+def _contains_diagram_cached(image_path: str, mtime_ns: int, size: int) -> bool:
+    """Diagram detection result cached per file version (path, mtime, size)."""
+    return contains_diagram(image_path)
 
-async def describe_image_groq(image_path: str) -> str:
+def _detect_image_mime(raw: bytes) -> str:
+    """Detect the image MIME type from its magic bytes (defaults to JPEG)."""
+    if raw[:8] == b'\x89PNG\r\n\x1a\n':
+        return "image/png"
+    if raw[:6] in (b'GIF87a', b'GIF89a'):
+        return "image/gif"
+    if raw[:4] == b'RIFF' and raw[8:12] == b'WEBP':
+        return "image/webp"
+    return "image/jpeg"
+
+# Entries are whole base64 data URLs (up to ~4 MB for a 3 MB upload), so
+# only the last few images are kept, enough for retries of the same image
+@lru_cache(maxsize=4)
+def _encode_image_data_url(image_path: str, mtime_ns: int, size: int) -> str:
     """
-    Enhanced image description that handles both text and diagrams.
+    Read an image file and return it as a base64 data URL.
     
-    Args:
-        image_path: Path to the image file
-        
-    Returns:
-        str: Formatted string with extracted text and/or diagram description
+    Large PNGs (typically screenshots) are re-encoded as JPEG before encoding
+    to shrink the upload. The modification time and size are part of the
+    cache key so a file that is overwritten in place is re-encoded instead
+    of served stale.
     """
-    if not os.path.exists(image_path):
-        return f"Error: Image file not found at {os.path.abspath(image_path)}"
+    raw = Path(image_path).read_bytes()
+    mime = _detect_image_mime(raw)
     
-    try:
-        from services.ocr_service import extract_text_from_path
-        
-        # Check if image contains diagrams
-        if contains_diagram(image_path):
-            print("Diagram detected in image, using specialized processing...")
-            # Extract and refine text from diagram
-            extracted_text = await extract_diagram_text(image_path)
-            refined_text = await refine_ocr_text(extracted_text)
-            
-            # Get description of the diagram
-            try:
-                diagram_desc = await describe_with_groq(
-                    image_path,
-                    "Describe this diagram in detail, including the type of diagram, "
-                    "key elements, and their relationships. Be factual and objective."
-                )
-            except Exception as e:
-                print(f"Diagram description error: {str(e)}")
-                diagram_desc = "Could not generate description for the diagram."
-            
-            return (
-                "DIAGRAM DETECTED\n"
-                "---------------\n"
-                f"ORIGINAL TEXT:\n{'-'*40}\n{extracted_text}\n\n"
-                f"REFINED TEXT:\n{'-'*40}\n{refined_text}\n\n"
-                f"DIAGRAM DESCRIPTION:\n{'-'*40}\n{diagram_desc}\n"
-                "--------------\n"
-            )
+    if mime == "image/png" and len(raw) > PNG_REENCODE_THRESHOLD:
+        img = Image.open(io.BytesIO(raw))
+        if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+            # JPEG has no alpha: flatten onto white so transparent areas (the
+            # usual background of line diagrams) don't turn black
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
         else:
-            # Standard text extraction
-            print("Processing as standard text image...")
-            extracted_text = extract_text_from_path(image_path)
-            refined_text = await refine_ocr_text(extracted_text)
-            
-            return (
-                "TEXT EXTRACTION\n"
-                "--------------\n"
-                f"ORIGINAL TEXT:\n{'-'*40}\n{extracted_text}\n\n"
-                
-                f"REFINED TEXT:\n{'-'*40}\n{refined_text}\n\n"
-            )
-            
-    except Exception as e:
-        error_msg = f"[Error] {str(e)}"
-        print(error_msg)
-        raise
+            img = img.convert("RGB")
+        
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=85, optimize=True)
+        raw, mime = buf.getvalue(), "image/jpeg"
+    
+    return f"data:{mime};base64,{base64.b64encode(raw).decode('ascii')}"
 
 async def describe_with_groq(image_path: str, prompt: str) -> str:
     """Helper function to get description from Groq API."""
     try:
-        # Read image as base64
-        with open(image_path, "rb") as img_file:
-            img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
+        # Read image as a data URL without blocking the event loop
+        st = os.stat(image_path)
+        image_url = await asyncio.to_thread(
+            _encode_image_data_url, image_path, st.st_mtime_ns, st.st_size
+        )
         
-        response = client.chat.completions.create(
+        response = await create_completion(
             model=MODEL_NAME,
             messages=[
                 {
@@ -239,7 +357,7 @@ async def describe_with_groq(image_path: str, prompt: str) -> str:
                         {"type": "text", "text": prompt},
                         {
                             "type": "image_url",
-                            "image_url": f"data:image/jpeg;base64,{img_base64}"
+                            "image_url": image_url
                         }
                     ]
                 }
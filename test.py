@@ -1,6 +1,7 @@
 # test.py
 import os
 import asyncio
+from time import perf_counter
 from services.vision_service import describe_image_stub
 
 async def test_vision(image_path: str):
@@ -13,7 +14,9 @@ async def test_vision(image_path: str):
     
     try:
         # Get image description using Groq API (includes OCR text)
+        start = perf_counter()
         description = await describe_image_stub(image_path)
+        elapsed_ms = (perf_counter() - start) * 1e3
         
         # Print results (contains EXTRACTED TEXT then DESCRIPTION)
         print("\n" + "="*50)
@@ -21,6 +24,7 @@ async def test_vision(image_path: str):
         print("="*50)
         print(description)
         print("="*50)
+        print(f"Processing time: {elapsed_ms:.2f} ms")
         
     except Exception as e:
         print(f"\nError during processing: {str(e)}")
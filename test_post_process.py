@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# test_post_process.py - Differential check of OCR post-processing against the original per-rule loop
+
+import os
+import re
+import sys
+import random
+
+# Add project root to path to allow absolute imports
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.ocr_service import OCR_WORD_CORRECTIONS, post_process_text
+
+
+def reference_post_process(text: str) -> str:
+    """The original implementation: one re.sub per correction, in table order."""
+    if not text:
+        return ""
+
+    for word, replacement in OCR_WORD_CORRECTIONS.items():
+        text = re.sub(r'\b' + re.escape(word) + r'\b', replacement, text, flags=re.IGNORECASE)
+
+    words = []
+    for word in text.split():
+        if len(word) > 1 or word.isalnum():
+            words.append(word)
+
+    return ' '.join(words)
+
+
+# Keys in several casings, Unicode case-fold variants of them, ordinary words
+# and stray symbols. No token ends in 'wi' or is a bare 'e', so the fuzzed
+# lines never contain the overlapping 'wi th e' form checked separately below.
+FUZZ_TOKENS = (
+    [variant for word in OCR_WORD_CORRECTIONS for variant in (word, word.upper(), word.title())]
+    + ['1ſ', 'th1ſ', 'quesİion', 'ſ', 'İ', 'K', 'ß', 'Ǆ']
+    + ['the', 'with', 'Groq', 'hello', 'x1y', 'a', '7', 'é']
+    + ['|', '-', '.', '_', '€', ',', '"']
+)
+
+
+def test_case_fold_variants():
+    """Case-fold matches of a key are corrected instead of raising KeyError."""
+    for text in ['1ſ', 'th1ſ', 'quesİion', 'It 1ſ here']:
+        assert post_process_text(text) == reference_post_process(text), text
+
+
+def test_overlapping_keys():
+    """Overlapping multi-word keys: the leftmost match wins (documented difference)."""
+    assert post_process_text('wi th e') == 'with e'
+    assert reference_post_process('wi th e') == 'wi the'
+
+
+def test_matches_reference(iterations: int = 20000, seed: int = 0):
+    """Random lines give the same output as the original per-rule loop."""
+    rng = random.Random(seed)
+    for _ in range(iterations):
+        tokens = rng.choices(FUZZ_TOKENS, k=rng.randint(1, 8))
+        text = rng.choice([' ', '  ', '\t']).join(tokens)
+        assert post_process_text(text) == reference_post_process(text), repr(text)
+
+
+if __name__ == "__main__":
+    test_case_fold_variants()
+    test_overlapping_keys()
+    test_matches_reference()
+    print("post_process_text matches the reference implementation")